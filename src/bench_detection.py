@@ -0,0 +1,86 @@
+import argparse
+import glob
+import os
+import time
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+from ultralytics import YOLO
+
+import lib.config as cnf
+import lib.object_detection as od
+
+IOU_MATCH = 0.5
+
+
+def load_labels(label_path, width, height):
+    if not os.path.exists(label_path):
+        return None
+
+    labels = np.loadtxt(label_path, ndmin=2)
+    if labels.size == 0:
+        return np.empty((0, 4))
+
+    cx, w = labels[:, 1] * width, labels[:, 3] * width
+    cy, h = labels[:, 2] * height, labels[:, 4] * height
+    return np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+
+
+def count_hits(pred, truth):
+    if len(pred) == 0 or len(truth) == 0:
+        return 0
+    return int((od.box_iou(truth, pred).max(axis=1) >= IOU_MATCH).sum())
+
+
+def run(config_path, image_dir, strategies, repeat):
+    config = cnf.load_config(config_path)
+    model = YOLO(config.file.model_path)
+
+    paths = sorted(glob.glob(os.path.join(image_dir, "*.tif*")))
+    if not paths:
+        raise FileNotFoundError(f"No frames found in {image_dir}")
+    images = [cv2.imread(p, cv2.IMREAD_UNCHANGED) for p in paths]
+
+    for strategy in strategies:
+        config.od.strategy = strategy
+        elapsed, found, hits, truths = 0.0, 0, 0, 0
+
+        for p, img in zip(paths, images):
+            height, width = img.shape[:2]
+            ctx = SimpleNamespace(
+                config=config, model=model, width_max=width, height_max=height
+            )
+            od.predict_boxes(ctx, img)  # warm-up
+
+            start = time.perf_counter()
+            for _ in range(repeat):
+                pred = od.predict_boxes(ctx, img)
+            elapsed += time.perf_counter() - start
+
+            found += len(pred)
+            truth = load_labels(os.path.splitext(p)[0] + ".txt", width, height)
+            if truth is not None:
+                hits += count_hits(pred, truth)
+                truths += len(truth)
+
+        fps = len(images) * repeat / elapsed
+        recall = f"{hits / truths:.3f}" if truths else "n/a"
+        print(f"{strategy:>8}: {fps:7.2f} frames/s, {found} boxes, recall={recall}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare detection strategies on saved full-sensor frames."
+    )
+    parser.add_argument("image_dir")
+    parser.add_argument("--config", default="config.toml")
+    parser.add_argument("--strategies", nargs="+", default=list(od.STRATEGIES))
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    run(args.config, args.image_dir, args.strategies, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
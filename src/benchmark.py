@@ -0,0 +1,380 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import replace
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+from scipy.ndimage import gaussian_filter
+
+import lib.camera as cmr
+import lib.config as cnf
+import lib.focus as fcs
+import lib.object_detection as od
+
+ROI_SIZE = 256
+BOX_NUM = 300
+BLUR_LEVELS = 16
+
+# absolute slack so timer noise on sub-millisecond cases is not a regression
+TIME_FLOOR = 0.005
+MEMORY_FLOOR_MB = 1.0
+
+# counters that measure work done; others such as boxes_kept are informational
+COST_COUNTERS = ("stage_moves", "frames", "evaluations", "bytes_written")
+
+
+class Counters(dict):
+    def add(self, key, value=1):
+        self[key] = self.get(key, 0) + value
+
+
+class FakeStage:
+    def __init__(self, counters, z):
+        self.counters = counters
+        self.z = z
+
+    def MOV(self, axes, targets):
+        self.counters.add("stage_moves")
+        if not isinstance(axes, list):
+            self.z = targets
+
+    def qPOS(self, axis):
+        return {axis: self.z}
+
+
+class FakeResult:
+    def __init__(self, img):
+        self.img = img
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def GrabSucceeded(self):
+        return True
+
+    def GetArray(self):
+        return self.img
+
+
+class FakeCamera:
+    """Serves frames whose blur grows with the distance from the focal plane."""
+
+    def __init__(self, counters, stage, frames, z_focus, z_range):
+        self.counters = counters
+        self.stage = stage
+        self.frames = frames
+        self.z_focus = z_focus
+        self.z_range = z_range
+        self.remaining = 0
+
+    def StartGrabbingMax(self, num):
+        self.remaining = num
+
+    def IsGrabbing(self):
+        return self.remaining > 0
+
+    def RetrieveResult(self, timeout, *args):
+        self.counters.add("frames")
+        self.remaining -= 1
+        level = abs(self.stage.z - self.z_focus) / self.z_range * len(self.frames)
+        return FakeResult(self.frames[min(int(level), len(self.frames) - 1)])
+
+    def StopGrabbing(self):
+        self.remaining = 0
+
+
+class FakeImage:
+    def AttachGrabResultBuffer(self, result):
+        self.img = result.GetArray()
+
+    def Save(self, file_format, filename):
+        cv2.imwrite(filename, self.img)
+
+    def Release(self):
+        self.img = None
+
+
+class FakeTensor:
+    def __init__(self, array):
+        self.array = array
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.array
+
+
+class FakeModel:
+    """Returns the sensor boxes for a frame and seeded random boxes per crop.
+
+    Crop boxes keep the sensor's box density and may run off the crop edge,
+    so the seam-merging path sees cut cells.
+    """
+
+    def __init__(self, boxes, height, width):
+        self.boxes = boxes
+        self.height = height
+        self.width = width
+
+    @staticmethod
+    def _result(boxes, shape):
+        boxes = SimpleNamespace(
+            xyxy=FakeTensor(boxes), conf=FakeTensor(np.linspace(1.0, 0.5, len(boxes)))
+        )
+        return SimpleNamespace(boxes=boxes, orig_shape=shape)
+
+    def _crop_boxes(self, height, width, seed):
+        num = max(
+            round(len(self.boxes) * height * width / (self.height * self.width)), 1
+        )
+        boxes = synthetic_boxes(height + 60, width + 60, num, seed) - 30
+        return np.clip(boxes, 0, [width, height, width, height])
+
+    def __call__(self, img, **kwargs):
+        if isinstance(img, list):
+            return [
+                self._result(self._crop_boxes(*crop.shape[:2], seed), crop.shape[:2])
+                for seed, crop in enumerate(img)
+            ]
+        scale = img.shape[1] / self.width
+        return [self._result(self.boxes * scale, img.shape[:2])]
+
+
+@contextmanager
+def mocked_hardware():
+    fake_pitools = SimpleNamespace(waitontarget=lambda *args, **kwargs: None)
+    fake_pylon = SimpleNamespace(
+        PylonImage=FakeImage,
+        ImageFileFormat_Tiff=None,
+        TimeoutHandling_ThrowException=None,
+    )
+    saved = (cmr.pitools, fcs.pitools, cmr.pylon)
+    cmr.pitools, fcs.pitools, cmr.pylon = fake_pitools, fake_pitools, fake_pylon
+    try:
+        yield
+    finally:
+        cmr.pitools, fcs.pitools, cmr.pylon = saved
+
+
+def synthetic_frame(height, width, seed=0):
+    rng = np.random.default_rng(seed)
+    img = np.full((height, width), 40, dtype=np.uint8)
+    for _ in range(max(height * width // 20000, 1)):
+        cy, cx = rng.integers(0, height), rng.integers(0, width)
+        cv2.circle(img, (int(cx), int(cy)), int(rng.integers(5, 20)), 200, -1)
+    noise = rng.normal(0, 4, img.shape)
+    return np.clip(img + noise, 0, 255).astype(np.uint8)
+
+
+def synthetic_boxes(height, width, num, seed=0):
+    rng = np.random.default_rng(seed)
+    x_min = rng.uniform(0, width - 60, num)
+    y_min = rng.uniform(0, height - 60, num)
+    size = rng.uniform(20, 60, num)
+    return np.stack([x_min, y_min, x_min + size, y_min + size], axis=1)
+
+
+def make_context(config, height, width, frames):
+    counters = Counters()
+    z_min, z_max = config.focus.z_min, config.focus.z_max
+    z_focus = z_min + 0.37 * (z_max - z_min)
+
+    stage = FakeStage(counters, (z_min + z_max) / 2)
+    camera = FakeCamera(counters, stage, frames, z_focus, z_max - z_min)
+
+    ctx = SimpleNamespace(
+        config=config,
+        camera=camera,
+        pidevice=stage,
+        model=FakeModel(synthetic_boxes(height, width, BOX_NUM), height, width),
+        width_max=width,
+        height_max=height,
+    )
+    return ctx, counters
+
+
+def make_cases(config, frame, save_dir):
+    height, width = frame.shape
+    roi = frame[:ROI_SIZE, :ROI_SIZE].copy()
+    boxes = np.round(synthetic_boxes(height, width, BOX_NUM)).astype(int)
+
+    def focus_case(ctx, counters):
+        evaluations = Counters()
+        get_avg = fcs.get_avg
+
+        def counted_get_avg(*args):
+            evaluations.add("evaluations")
+            return get_avg(*args)
+
+        fcs.get_avg = counted_get_avg
+        try:
+            fcs.autofocus_golden(ctx, fcs.measure_std_dev)
+        finally:
+            fcs.get_avg = get_avg
+        counters.update(evaluations)
+
+    def detection_case(strategy):
+        strategy_config = replace(config, od=replace(config.od, strategy=strategy))
+
+        def case(ctx, counters):
+            ctx.config = strategy_config
+            bboxes = od.get_bounding_boxes(ctx, frame)
+            counters.add("boxes_kept", 0 if bboxes is None else len(bboxes))
+
+        return case
+
+    def save_case(ctx, counters):
+        frame_dir = os.path.join(save_dir, "frames")
+        ctx.camera.frames = [roi]
+        cmr.save_images(ctx.camera, config.camera.img_num, frame_dir, None)
+        counters.add(
+            "bytes_written",
+            sum(entry.stat().st_size for entry in os.scandir(frame_dir)),
+        )
+        shutil.rmtree(frame_dir)
+
+    return {
+        "measure_std_dev_full": lambda ctx, c: fcs.measure_std_dev(frame),
+        "measure_std_dev_roi": lambda ctx, c: fcs.measure_std_dev(roi),
+        "get_avg": lambda ctx, c: fcs.get_avg(
+            (config.focus.z_min + config.focus.z_max) / 2, ctx, fcs.measure_std_dev
+        ),
+        "autofocus_golden": focus_case,
+        "sanitize_mask": lambda ctx, c: c.add(
+            "boxes_kept", len(od.sanitize_mask(boxes, ctx))
+        ),
+        "get_bounding_boxes": detection_case("full"),
+        "get_bounding_boxes_tiled": detection_case("tiled"),
+        "get_bounding_boxes_pyramid": detection_case("pyramid"),
+        "save_images": save_case,
+    }
+
+
+def run_case(case, config, height, width, frames, repeat):
+    times = []
+    for _ in range(repeat):
+        ctx, counters = make_context(config, height, width, frames)
+        start = time.perf_counter()
+        case(ctx, counters)
+        times.append(time.perf_counter() - start)
+
+    ctx, _ = make_context(config, height, width, frames)
+    tracemalloc.start()
+    case(ctx, Counters())
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "time": min(times),
+        "peak_mb": peak / 2**20,
+        "counters": dict(counters),
+    }
+
+
+def compare(results, baseline, max_slowdown, max_memory):
+    failures = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        base = baseline[name]
+
+        if result["time"] > base["time"] * (1 + max_slowdown) + TIME_FLOOR:
+            failures.append(
+                f"{name}: time {result['time']:.4f}s vs baseline {base['time']:.4f}s"
+            )
+        if result["peak_mb"] > base["peak_mb"] * (1 + max_memory) + MEMORY_FLOOR_MB:
+            failures.append(
+                f"{name}: peak memory {result['peak_mb']:.1f}MB "
+                f"vs baseline {base['peak_mb']:.1f}MB"
+            )
+        for key, value in result["counters"].items():
+            if key not in COST_COUNTERS or key not in base["counters"]:
+                continue
+            if value > base["counters"][key]:
+                failures.append(
+                    f"{name}: {key} {value} vs baseline {base['counters'][key]}"
+                )
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time focus, detection post-processing and I/O hot paths "
+        "against a mocked camera and stage."
+    )
+    parser.add_argument("--config", default="config.toml")
+    parser.add_argument("--baseline", default="bench_baseline.json")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--width", type=int, default=2448)
+    parser.add_argument("--height", type=int, default=2048)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-slowdown", type=float, default=0.25)
+    parser.add_argument("--max-memory", type=float, default=0.25)
+    parser.add_argument("--only", nargs="+")
+    args = parser.parse_args()
+
+    config = cnf.load_config(args.config)
+    config.en.sanitize = True
+
+    # focus runs after the ROI is applied, so the camera serves cell-sized frames
+    frame = synthetic_frame(args.height, args.width)
+    roi = frame[:ROI_SIZE, :ROI_SIZE]
+    frames = [gaussian_filter(roi, sigma) for sigma in range(BLUR_LEVELS)]
+
+    save_dir = tempfile.mkdtemp(prefix="acusto-bench-")
+    results = {}
+    try:
+        with mocked_hardware():
+            cases = make_cases(config, frame, save_dir)
+            for name, case in cases.items():
+                if args.only and name not in args.only:
+                    continue
+                results[name] = run_case(
+                    case, config, args.height, args.width, frames, args.repeat
+                )
+                print(
+                    f"{name:>26}: {results[name]['time'] * 1000:9.2f} ms, "
+                    f"{results[name]['peak_mb']:7.1f} MB, {results[name]['counters']}"
+                )
+    finally:
+        shutil.rmtree(save_dir, ignore_errors=True)
+
+    if args.update_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as file:
+                baseline = json.load(file)
+        baseline.update(results)
+        with open(args.baseline, "w") as file:
+            json.dump(baseline, file, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}, run with --update-baseline first.")
+        sys.exit(1)
+
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+
+    failures = compare(results, baseline, args.max_slowdown, args.max_memory)
+    for failure in failures:
+        print(f"REGRESSION {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
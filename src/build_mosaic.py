@@ -0,0 +1,63 @@
+import argparse
+import logging
+import time
+
+import cv2
+
+import lib.config as cnf
+from lib.mosaic import SpatialIndex, build_pyramid, render_overview
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Index a finished scan and build its mosaic pyramid."
+    )
+    parser.add_argument("--config", default="config.toml")
+    parser.add_argument(
+        "--region",
+        nargs=4,
+        type=float,
+        metavar=("X_MIN", "Y_MIN", "X_MAX", "Y_MAX"),
+        help="render an overview of this stage region after building",
+    )
+    parser.add_argument("--overview", default="overview.png")
+    parser.add_argument("--max-px", type=int, default=1024)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    logger = logging.getLogger(__name__)
+
+    config = cnf.load_config(args.config)
+    save_dir = config.file.save_dir
+
+    start = time.perf_counter()
+    index = SpatialIndex.from_manifest(save_dir, config.mosaic.pixel_size)
+    logger.info(
+        f"Indexed {len(index.entries)} cells in {time.perf_counter() - start:.3f}s"
+    )
+
+    build_pyramid(
+        index,
+        save_dir,
+        config.mosaic.pixel_size,
+        config.mosaic.base_scale,
+        config.mosaic.tile_px,
+        logger,
+    )
+
+    if args.region:
+        start = time.perf_counter()
+        cells = index.query(*args.region)
+        overview = render_overview(save_dir, args.region, args.max_px)
+        logger.info(
+            f"Region holds {len(cells)} cells, rendered in "
+            f"{time.perf_counter() - start:.3f}s"
+        )
+        if overview.size == 0:
+            logger.warning("Region lies outside the mosaic, no overview written.")
+        else:
+            cv2.imwrite(args.overview, overview)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+import math
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+# weight of the newest measurement in the running estimates
+ALPHA = 0.3
+
+
+@dataclass
+class CellPlan:
+    idx: int
+    img_num: int
+    fps: float
+    pixels: int = 0
+
+
+class AcquisitionBudget:
+    """Splits the remaining session time and disk space over the pending tiles.
+
+    Cells are expected in priority order (detections come sorted by
+    confidence), so the last cells of a tile are dropped first.
+    """
+
+    def __init__(self, config, logger, used_bytes=0, elapsed_s=0.0):
+        self.logger = logger
+        self.fps = config.camera.fps
+
+        # depth stacks grab a fixed number of frames, paced by stage moves
+        self.adjustable = not config.en.depth
+        if self.adjustable:
+            self.img_num = config.camera.img_num
+        else:
+            self.img_num = 2 * config.movement.z_max_step + 1
+        self.min_img_num = min(config.budget.min_img_num, self.img_num)
+        self.min_fps = config.budget.min_fps
+        self.session_s = config.budget.session_s
+        self.disk_bytes = config.budget.disk_gb * 1e9
+
+        self.write_rate = config.budget.write_mbps * 1e6
+        self.cell_overhead = config.budget.cell_overhead_s
+        self.tile_overhead = 0.0
+        self.bytes_per_px = 1.0
+        self.frame_time = None
+
+        self.used_bytes = used_bytes
+        self.start = time.monotonic() - elapsed_s
+        self.tile_start = self.start
+        self.tiles_left = 1
+
+    def start_tile(self, tiles_left):
+        self.tile_start = time.monotonic()
+        self.tiles_left = max(tiles_left, 1)
+
+    def _capture_time(self, img_num, fps, pixels):
+        if not self.adjustable:
+            return img_num * (self.frame_time or 1 / fps)
+        return max(
+            img_num / fps, img_num * pixels * self.bytes_per_px / self.write_rate
+        )
+
+    def _shares(self):
+        time_share = (
+            self.session_s - (time.monotonic() - self.start)
+        ) / self.tiles_left - self.tile_overhead
+        disk_share = (self.disk_bytes - self.used_bytes) / self.tiles_left
+        return time_share, disk_share
+
+    def exhausted(self) -> Optional[str]:
+        # the per-tile shares may run out long before the budget does;
+        # plan_tile drops cells then, the scan only stops once nothing fits
+        remaining_s = self.session_s - (time.monotonic() - self.start)
+        min_img_num = self.min_img_num if self.adjustable else self.img_num
+        min_tile_s = (
+            self.tile_overhead
+            + self.cell_overhead
+            + self._capture_time(min_img_num, self.fps, 0)
+        )
+        if remaining_s < min_tile_s:
+            return (
+                f"{remaining_s:.0f} s of session time left, "
+                f"one tile needs at least {min_tile_s:.0f} s"
+            )
+        if self.used_bytes >= self.disk_bytes:
+            return (
+                f"disk budget used up ({self.used_bytes / 1e9:.2f}/"
+                f"{self.disk_bytes / 1e9:.2f} GB)"
+            )
+        return None
+
+    def plan_tile(self, cells, width_max, height_max) -> dict:
+        now = time.monotonic()
+        self.tile_overhead += ALPHA * (now - self.tile_start - self.tile_overhead)
+
+        time_share, disk_share = self._shares()
+        self.log_usage()
+
+        min_img_num = self.min_img_num if self.adjustable else self.img_num
+        kept = []
+        min_time = min_disk = 0.0
+        for pos, (idx, bbox) in enumerate(cells):
+            x_min, y_min, x_max, y_max = bbox
+            pixels = max(min(x_max, width_max) - max(x_min, 0), 1) * max(
+                min(y_max, height_max) - max(y_min, 0), 1
+            )
+
+            cell_time = self.cell_overhead + self._capture_time(
+                min_img_num, self.fps, pixels
+            )
+            cell_disk = min_img_num * pixels * self.bytes_per_px
+            if min_time + cell_time > time_share or min_disk + cell_disk > disk_share:
+                dropped = [idx for idx, _ in cells[pos:]]
+                self.logger.warning(f"Budget exhausted, dropping cells {dropped}")
+                break
+
+            min_time += cell_time
+            min_disk += cell_disk
+            kept.append((idx, pixels))
+
+        if not kept:
+            return {}
+
+        if not self.adjustable:
+            return {
+                idx: CellPlan(idx, self.img_num, self.fps, pixels)
+                for idx, pixels in kept
+            }
+
+        full_capture = sum(
+            self._capture_time(self.img_num, self.fps, pixels) for _, pixels in kept
+        )
+        full_disk = sum(self.img_num * pixels * self.bytes_per_px for _, pixels in kept)
+        time_factor = min(
+            1.0, (time_share - len(kept) * self.cell_overhead) / full_capture
+        )
+        disk_factor = min(1.0, disk_share / full_disk)
+
+        # when only disk is short, lower the frame rate so the burst still
+        # spans as much time as the time budget allows
+        img_num = max(
+            self.min_img_num,
+            math.floor(self.img_num * min(time_factor, disk_factor)),
+        )
+        window = max(self.img_num / self.fps * time_factor, img_num / self.fps)
+        fps = min(self.fps, max(self.min_fps, img_num / window))
+
+        if img_num < self.img_num:
+            self.logger.info(
+                f"Budget: capturing {img_num} frames at {fps:.1f} fps "
+                f"for {len(kept)} cells"
+            )
+        return {idx: CellPlan(idx, img_num, fps, pixels) for idx, pixels in kept}
+
+    def record_cell(self, plan, nbytes, capture_s, cell_s):
+        self.used_bytes += nbytes
+
+        frame_bytes = nbytes / max(plan.img_num * plan.pixels, 1)
+        self.bytes_per_px += ALPHA * (frame_bytes - self.bytes_per_px)
+        self.cell_overhead += ALPHA * (cell_s - capture_s - self.cell_overhead)
+
+        if not self.adjustable:
+            frame_time = capture_s / plan.img_num
+            if self.frame_time is None:
+                self.frame_time = frame_time
+            else:
+                self.frame_time += ALPHA * (frame_time - self.frame_time)
+            return
+
+        # a burst finishing at the frame rate only bounds the write speed
+        measured_rate = nbytes / max(capture_s, 1e-6)
+        if capture_s > plan.img_num / plan.fps * 1.05:
+            self.write_rate += ALPHA * (measured_rate - self.write_rate)
+        else:
+            self.write_rate = max(self.write_rate, measured_rate)
+
+    def log_usage(self):
+        elapsed = time.monotonic() - self.start
+        self.logger.info(
+            f"Budget used: {elapsed / 60:.1f}/{self.session_s / 60:.1f} min, "
+            f"{self.used_bytes / 1e9:.2f}/{self.disk_bytes / 1e9:.2f} GB, "
+            f"{self.tiles_left} tiles left, "
+            f"write rate {self.write_rate / 1e6:.0f} MB/s"
+        )
@@ -96,6 +96,7 @@ def reset_camera(ctx, logger):
         ctx.camera.OffsetY.Value = 0
         ctx.camera.Width.Value = ctx.width_max
         ctx.camera.Height.Value = ctx.height_max
+        ctx.camera.AcquisitionFrameRate.Value = ctx.config.camera.fps
         logger.info("Camera settings reset.")
     except Exception as e:
         logger.critical(f"Error resetting camera settings: {e}")
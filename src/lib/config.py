@@ -3,6 +3,8 @@ from typing import List
 
 import tomllib
 
+STRATEGIES = ("full", "tiled", "pyramid")
+
 
 @dataclass
 class CameraConfig:
@@ -47,6 +49,11 @@ class ODConfig:
     buffer_size: int
     d_cells: int
     d_boundary: int
+    strategy: str
+    tile_size: int
+    tile_overlap: int
+    nms_iou: float
+    pyramid_scale: int
 
 
 @dataclass
@@ -71,6 +78,25 @@ class EnConfig:
     object_detection: bool
     depth: bool
     sanitize: bool
+    resume: bool
+    budget: bool
+
+
+@dataclass
+class MosaicConfig:
+    pixel_size: float
+    base_scale: int
+    tile_px: int
+
+
+@dataclass
+class BudgetConfig:
+    session_s: float
+    disk_gb: float
+    min_img_num: int
+    min_fps: float
+    write_mbps: float
+    cell_overhead_s: float
 
 
 @dataclass
@@ -84,6 +110,8 @@ class Config:
     en: EnConfig
     focus: FocusConfig
     od: ODConfig
+    mosaic: MosaicConfig
+    budget: BudgetConfig
 
     @classmethod
     def from_dict(cls, config_dict: dict) -> "Config":
@@ -97,6 +125,8 @@ class Config:
             en=EnConfig(**config_dict["EN"]),
             focus=FocusConfig(**config_dict["FOCUS"]),
             od=ODConfig(**config_dict["OD"]),
+            mosaic=MosaicConfig(**config_dict["MOSAIC"]),
+            budget=BudgetConfig(**config_dict["BUDGET"]),
         )
 
 
@@ -114,6 +144,21 @@ def load_config(config_path="config.toml"):
         // config["MOVEMENT"]["dy"]
     )
 
+    if config["OD"]["strategy"] not in STRATEGIES:
+        raise ValueError(
+            f"Unknown detection strategy: {config['OD']['strategy']}, "
+            f"expected one of {STRATEGIES}"
+        )
+    if not 0 <= config["OD"]["tile_overlap"] < config["OD"]["tile_size"]:
+        raise ValueError(
+            f"OD tile_overlap must be in [0, tile_size), got "
+            f"{config['OD']['tile_overlap']} for tile_size {config['OD']['tile_size']}"
+        )
+    if config["OD"]["pyramid_scale"] < 1:
+        raise ValueError(
+            f"OD pyramid_scale must be at least 1, got {config['OD']['pyramid_scale']}"
+        )
+
     config["FOCUS"]["step_coarse"] *= config["MOVEMENT"]["dz"]
     config["FOCUS"]["step_fine"] *= config["MOVEMENT"]["dz"]
     config["FOCUS"]["step_finer"] *= config["MOVEMENT"]["dz"]
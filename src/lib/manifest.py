@@ -0,0 +1,143 @@
+import json
+import os
+import time
+import zlib
+
+MANIFEST_NAME = "manifest.jsonl"
+
+
+def scan_plan(config) -> dict:
+    return {
+        "pt1": list(config.vertex.pt1),
+        "pt2": list(config.vertex.pt2),
+        "dx": config.movement.dx,
+        "dy": config.movement.dy,
+        "x_step_num": config.movement.x_step_num,
+        "y_step_num": config.movement.y_step_num,
+    }
+
+
+def read_manifest(path: str) -> list:
+    records = []
+    with open(path, "rb") as file:
+        for line in file:
+            if not line.endswith(b"\n"):
+                # torn write from an interrupted scan
+                break
+            records.append(json.loads(line))
+    return records
+
+
+def summarize_frames(frame_dir: str):
+    count = 0
+    size = 0
+    crc = 0
+    for name in sorted(os.listdir(frame_dir)):
+        with open(os.path.join(frame_dir, name), "rb") as file:
+            for chunk in iter(lambda: file.read(1 << 20), b""):
+                crc = zlib.crc32(chunk, crc)
+                size += len(chunk)
+        count += 1
+    return count, size, f"{crc:08x}"
+
+
+class Manifest:
+    def __init__(self, save_dir: str, plan: dict, resume: bool, logger):
+        self.save_dir = save_dir
+        self.path = os.path.join(save_dir, MANIFEST_NAME)
+        self.logger = logger
+
+        self.tiles = set()
+        self.detections = {}
+        self.cells = {}
+
+        # scan time carried over from earlier sessions of a resumed scan
+        self.prior_elapsed = 0.0
+        self.clock_start = time.monotonic()
+
+        if resume and os.path.exists(self.path):
+            self._load(plan)
+            self.file = open(self.path, "a")
+        else:
+            if os.path.exists(self.path):
+                rotated = f"{self.path}.{time.strftime('%Y%m%d-%H%M%S')}"
+                os.replace(self.path, rotated)
+                self.logger.warning(f"Existing manifest moved to {rotated}")
+            self.file = open(self.path, "w")
+            self._append({"type": "scan", "plan": plan})
+
+    def _load(self, plan):
+        records = read_manifest(self.path)
+        if not records or records[0].get("plan") != plan:
+            raise ValueError(
+                f"Manifest {self.path} does not match the configured scan plan."
+            )
+
+        # drop a torn trailing line so appended records start on a fresh line
+        with open(self.path, "rb+") as file:
+            data = file.read()
+            file.truncate(data.rfind(b"\n") + 1)
+
+        self.prior_elapsed = max(record.get("elapsed_s", 0.0) for record in records)
+        for record in records[1:]:
+            tile = tuple(record.get("tile", ()))
+            if record["type"] == "tile":
+                self.tiles.add(tile)
+            elif record["type"] == "detect":
+                self.detections[tile] = record["bboxes"]
+            elif record["type"] == "cell":
+                self.cells[tile + (record["cell"],)] = record
+
+        self.logger.info(
+            f"Resuming scan: {len(self.tiles)} tiles and {len(self.cells)} cells "
+            "already complete."
+        )
+
+    def elapsed(self) -> float:
+        return self.prior_elapsed + time.monotonic() - self.clock_start
+
+    def _append(self, record: dict):
+        record["elapsed_s"] = round(self.elapsed(), 3)
+        self.file.write(json.dumps(record) + "\n")
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def record_detection(self, tile, position, bboxes):
+        bboxes = [[int(v) for v in bbox] for bbox in bboxes]
+        self.detections[tuple(tile)] = bboxes
+        self._append(
+            {
+                "type": "detect",
+                "tile": list(tile),
+                "position": list(position),
+                "bboxes": bboxes,
+            }
+        )
+
+    def record_cell(self, tile, idx, position, bbox, frame_dir, focus_z):
+        frame_count, size, checksum = summarize_frames(frame_dir)
+        record = {
+            "type": "cell",
+            "tile": list(tile),
+            "cell": idx,
+            "position": list(position),
+            "bbox": [int(v) for v in bbox],
+            "dir": os.path.relpath(frame_dir, self.save_dir),
+            "focus_z": focus_z,
+            "frame_count": frame_count,
+            "bytes": size,
+            "checksum": checksum,
+        }
+        self.cells[tuple(tile) + (idx,)] = record
+        self._append(record)
+        return record
+
+    def used_bytes(self) -> int:
+        return sum(record.get("bytes", 0) for record in self.cells.values())
+
+    def record_tile(self, tile, position):
+        self.tiles.add(tuple(tile))
+        self._append({"type": "tile", "tile": list(tile), "position": list(position)})
+
+    def close(self):
+        self.file.close()
@@ -0,0 +1,223 @@
+import json
+import math
+import os
+from collections import defaultdict
+
+import cv2
+import numpy as np
+
+from lib.manifest import MANIFEST_NAME, read_manifest
+
+MOSAIC_DIR = "mosaic"
+META_NAME = "meta.json"
+
+
+class SpatialIndex:
+    """Uniform grid over stage coordinates mapping footprints to frame dirs."""
+
+    def __init__(self, bucket_x: float, bucket_y: float):
+        self.bucket_x = bucket_x
+        self.bucket_y = bucket_y
+        self.entries = []
+        self.grid = defaultdict(list)
+
+    @classmethod
+    def from_manifest(cls, save_dir: str, pixel_size: float) -> "SpatialIndex":
+        records = read_manifest(os.path.join(save_dir, MANIFEST_NAME))
+        plan = records[0]["plan"]
+
+        index = cls(plan["dx"], plan["dy"])
+        for record in records[1:]:
+            if record["type"] == "cell":
+                index.add(record, save_dir, pixel_size)
+
+        if not index.entries:
+            raise ValueError(f"No captured cells recorded in {save_dir}.")
+        return index
+
+    def _buckets(self, x_min, y_min, x_max, y_max):
+        for i in range(
+            math.floor(x_min / self.bucket_x), math.floor(x_max / self.bucket_x) + 1
+        ):
+            for j in range(
+                math.floor(y_min / self.bucket_y),
+                math.floor(y_max / self.bucket_y) + 1,
+            ):
+                yield i, j
+
+    def add(self, record: dict, save_dir: str, pixel_size: float):
+        # stage position is taken as the sensor origin, the bbox offsets from it
+        pos_x, pos_y = record["position"]
+        bx_min, by_min, bx_max, by_max = record["bbox"]
+        footprint = (
+            pos_x + max(bx_min, 0) * pixel_size,
+            pos_y + max(by_min, 0) * pixel_size,
+            pos_x + bx_max * pixel_size,
+            pos_y + by_max * pixel_size,
+        )
+        entry = {
+            "footprint": footprint,
+            "dir": os.path.join(save_dir, record["dir"]),
+            "tile": tuple(record["tile"]),
+            "cell": record["cell"],
+            "frame_count": record["frame_count"],
+        }
+
+        idx = len(self.entries)
+        self.entries.append(entry)
+        for key in self._buckets(*footprint):
+            self.grid[key].append(idx)
+
+    def query(self, x_min, y_min, x_max, y_max) -> list:
+        found = set()
+        for key in self._buckets(x_min, y_min, x_max, y_max):
+            for idx in self.grid.get(key, ()):
+                fx_min, fy_min, fx_max, fy_max = self.entries[idx]["footprint"]
+                if (
+                    fx_min < x_max
+                    and fx_max > x_min
+                    and fy_min < y_max
+                    and fy_max > y_min
+                ):
+                    found.add(idx)
+        return [self.entries[idx] for idx in sorted(found)]
+
+    def bounds(self):
+        footprints = np.array([entry["footprint"] for entry in self.entries])
+        return (
+            footprints[:, 0].min(),
+            footprints[:, 1].min(),
+            footprints[:, 2].max(),
+            footprints[:, 3].max(),
+        )
+
+
+def representative_frame(frame_dir: str) -> str:
+    names = sorted(
+        (name for name in os.listdir(frame_dir) if name.endswith(".tiff")),
+        key=lambda name: int(os.path.splitext(name)[0]),
+    )
+    return os.path.join(frame_dir, names[len(names) // 2])
+
+
+def build_pyramid(
+    index: SpatialIndex,
+    save_dir: str,
+    pixel_size: float,
+    base_scale: int,
+    tile_px: int,
+    logger,
+):
+    x_min, y_min, x_max, y_max = index.bounds()
+    level_pixel = pixel_size * base_scale
+    width = math.ceil((x_max - x_min) / level_pixel)
+    height = math.ceil((y_max - y_min) / level_pixel)
+
+    logger.info(
+        f"Building {width}x{height} base mosaic from {len(index.entries)} cells"
+    )
+    canvas = None
+    for entry in index.entries:
+        try:
+            img = cv2.imread(representative_frame(entry["dir"]), cv2.IMREAD_UNCHANGED)
+        except (OSError, IndexError):
+            img = None
+        if img is None:
+            logger.warning(f"Could not read a frame from {entry['dir']}")
+            continue
+        if canvas is None:
+            canvas = np.zeros((height, width) + img.shape[2:], dtype=img.dtype)
+
+        img = cv2.resize(
+            img,
+            (max(img.shape[1] // base_scale, 1), max(img.shape[0] // base_scale, 1)),
+            interpolation=cv2.INTER_AREA,
+        )
+        col = int((entry["footprint"][0] - x_min) / level_pixel)
+        row = int((entry["footprint"][1] - y_min) / level_pixel)
+        img = img[: height - row, : width - col]
+        canvas[row : row + img.shape[0], col : col + img.shape[1]] = img
+
+    if canvas is None:
+        raise ValueError("No frames could be read for the mosaic.")
+
+    mosaic_dir = os.path.join(save_dir, MOSAIC_DIR)
+    levels = []
+    level = 0
+    while True:
+        level_dir = os.path.join(mosaic_dir, str(level))
+        os.makedirs(level_dir, exist_ok=True)
+        for row in range(0, canvas.shape[0], tile_px):
+            for col in range(0, canvas.shape[1], tile_px):
+                cv2.imwrite(
+                    os.path.join(level_dir, f"{row // tile_px}_{col // tile_px}.png"),
+                    canvas[row : row + tile_px, col : col + tile_px],
+                )
+        levels.append(
+            {"pixel_size": level_pixel, "shape": [canvas.shape[0], canvas.shape[1]]}
+        )
+
+        if max(canvas.shape[:2]) <= tile_px:
+            break
+        canvas = cv2.resize(
+            canvas,
+            (max(canvas.shape[1] // 2, 1), max(canvas.shape[0] // 2, 1)),
+            interpolation=cv2.INTER_AREA,
+        )
+        level_pixel *= 2
+        level += 1
+
+    meta = {"origin": [x_min, y_min], "tile_px": tile_px, "levels": levels}
+    with open(os.path.join(mosaic_dir, META_NAME), "w") as file:
+        json.dump(meta, file)
+
+    logger.info(f"Wrote {len(levels)} mosaic levels to {mosaic_dir}")
+    return meta
+
+
+def render_overview(save_dir: str, region, max_px: int) -> np.ndarray:
+    mosaic_dir = os.path.join(save_dir, MOSAIC_DIR)
+    with open(os.path.join(mosaic_dir, META_NAME)) as file:
+        meta = json.load(file)
+
+    x_min, y_min, x_max, y_max = region
+    origin_x, origin_y = meta["origin"]
+    tile_px = meta["tile_px"]
+
+    # finest level whose crop of the region still fits in max_px
+    for level, info in enumerate(meta["levels"]):
+        span = max(x_max - x_min, y_max - y_min) / info["pixel_size"]
+        if span <= max_px:
+            break
+
+    pixel = info["pixel_size"]
+    height, width = info["shape"]
+    col_min = max(int((x_min - origin_x) / pixel), 0)
+    row_min = max(int((y_min - origin_y) / pixel), 0)
+    col_max = min(math.ceil((x_max - origin_x) / pixel), width)
+    row_max = min(math.ceil((y_max - origin_y) / pixel), height)
+    if col_max <= col_min or row_max <= row_min:
+        return np.zeros((0, 0), dtype=np.uint8)
+
+    out = None
+    for tile_row in range(row_min // tile_px, (row_max - 1) // tile_px + 1):
+        for tile_col in range(col_min // tile_px, (col_max - 1) // tile_px + 1):
+            tile = cv2.imread(
+                os.path.join(mosaic_dir, str(level), f"{tile_row}_{tile_col}.png"),
+                cv2.IMREAD_UNCHANGED,
+            )
+            if out is None:
+                out = np.zeros(
+                    (row_max - row_min, col_max - col_min) + tile.shape[2:],
+                    dtype=tile.dtype,
+                )
+
+            top, left = tile_row * tile_px, tile_col * tile_px
+            r0, c0 = max(row_min, top), max(col_min, left)
+            r1 = min(row_max, top + tile.shape[0])
+            c1 = min(col_max, left + tile.shape[1])
+            out[r0 - row_min : r1 - row_min, c0 - col_min : c1 - col_min] = tile[
+                r0 - top : r1 - top, c0 - left : c1 - left
+            ]
+
+    return out
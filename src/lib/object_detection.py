@@ -4,16 +4,19 @@ import numpy as np
 
 import lib.camera as cmr
 import lib.context as ctx
+from lib.config import STRATEGIES
+
+# Boxes closer than this to an interior tile edge are treated as truncated.
+EDGE_EPS = 2
 
 
 def get_bounding_boxes(ctx: ctx.AppContext, img: np.ndarray) -> Optional[np.ndarray]:
-    results = ctx.model(img)
-    bboxes = results[0].boxes.xyxy
+    bboxes = predict_boxes(ctx, img)
 
     if bboxes.shape[0] == 0:
         return None
 
-    bboxes = np.round(bboxes.cpu().numpy()).astype(int)
+    bboxes = np.round(bboxes).astype(int)
 
     if ctx.config.en.sanitize:
         bboxes = sanitize_mask(bboxes, ctx)
@@ -26,6 +29,215 @@ def get_bounding_boxes(ctx: ctx.AppContext, img: np.ndarray) -> Optional[np.ndar
     return bboxes
 
 
+def predict_boxes(ctx: ctx.AppContext, img: np.ndarray) -> np.ndarray:
+    strategy = ctx.config.od.strategy
+    if strategy == "full":
+        results = ctx.model(img)
+        return results[0].boxes.xyxy.cpu().numpy()
+    if strategy == "tiled":
+        return _predict_tiled(ctx, img)
+    if strategy == "pyramid":
+        return _predict_pyramid(ctx, img)
+    raise ValueError(
+        f"Unknown detection strategy: {strategy}, expected one of {STRATEGIES}"
+    )
+
+
+def _predict_tiled(ctx: ctx.AppContext, img: np.ndarray) -> np.ndarray:
+    height, width = img.shape[:2]
+    tile = ctx.config.od.tile_size
+    overlap = ctx.config.od.tile_overlap
+
+    windows = [
+        (x, y)
+        for y in _tile_origins(height, tile, overlap)
+        for x in _tile_origins(width, tile, overlap)
+    ]
+    return _predict_windows(ctx, img, windows)
+
+
+def _predict_pyramid(ctx: ctx.AppContext, img: np.ndarray) -> np.ndarray:
+    height, width = img.shape[:2]
+    tile = ctx.config.od.tile_size
+    scale = ctx.config.od.pyramid_scale
+
+    coarse = ctx.model(_downscale(img, scale))[0].boxes.xyxy.cpu().numpy() * scale
+    if coarse.shape[0] == 0:
+        return coarse.reshape(0, 4)
+
+    # one full-resolution window per occupied region, unless an earlier window
+    # already contains it with enough margin to avoid truncation
+    margin = ctx.config.od.tile_overlap // 2
+    windows = []
+    for x_min, y_min, x_max, y_max in coarse:
+        if any(
+            x_min - margin >= wx
+            and y_min - margin >= wy
+            and x_max + margin <= wx + tile
+            and y_max + margin <= wy + tile
+            for wx, wy in windows
+        ):
+            continue
+        cx, cy = (x_min + x_max) / 2, (y_min + y_max) / 2
+        wx = int(np.clip(cx - tile / 2, 0, max(width - tile, 0)))
+        wy = int(np.clip(cy - tile / 2, 0, max(height - tile, 0)))
+        windows.append((wx, wy))
+
+    return _predict_windows(ctx, img, windows)
+
+
+def _predict_windows(ctx: ctx.AppContext, img: np.ndarray, windows) -> np.ndarray:
+    height, width = img.shape[:2]
+    tile = ctx.config.od.tile_size
+
+    crops = [img[y : y + tile, x : x + tile] for x, y in windows]
+    results = ctx.model(crops, imgsz=tile)
+
+    full_boxes, full_scores = [], []
+    cut_boxes, cut_scores, cut_windows = [], [], []
+    for window, ((x, y), result) in enumerate(zip(windows, results)):
+        boxes = result.boxes.xyxy.cpu().numpy()
+        scores = result.boxes.conf.cpu().numpy()
+        crop_h, crop_w = result.orig_shape
+
+        cut = np.zeros(len(boxes), dtype=bool)
+        if x > 0:
+            cut |= boxes[:, 0] <= EDGE_EPS
+        if y > 0:
+            cut |= boxes[:, 1] <= EDGE_EPS
+        if x + crop_w < width:
+            cut |= boxes[:, 2] >= crop_w - EDGE_EPS
+        if y + crop_h < height:
+            cut |= boxes[:, 3] >= crop_h - EDGE_EPS
+
+        boxes = boxes + np.array([x, y, x, y], dtype=boxes.dtype)
+        full_boxes.append(boxes[~cut])
+        full_scores.append(scores[~cut])
+        cut_boxes.append(boxes[cut])
+        cut_scores.append(scores[cut])
+        cut_windows.append(np.full(cut.sum(), window))
+
+    if not full_boxes:
+        return np.empty((0, 4), dtype=np.float32)
+
+    boxes = np.concatenate(full_boxes)
+    scores = np.concatenate(full_scores)
+    merged, merged_scores = _merge_cut_boxes(
+        np.concatenate(cut_boxes),
+        np.concatenate(cut_scores),
+        np.concatenate(cut_windows),
+        boxes,
+    )
+
+    boxes = np.concatenate([boxes, merged])
+    scores = np.concatenate([scores, merged_scores])
+    if len(boxes) == 0:
+        return boxes.reshape(0, 4)
+    return boxes[nms(boxes, scores, ctx.config.od.nms_iou)]
+
+
+def _merge_cut_boxes(boxes, scores, windows, full_boxes):
+    """Joins the pieces of cells cut by tile seams into one box.
+
+    Pieces from different tiles that overlap belong to the same cell, since
+    neighbouring tiles share the seam region. A joined box that lies mostly
+    inside a box some tile saw whole is dropped in favour of that box.
+    """
+    n = len(boxes)
+    if n == 0:
+        return boxes.reshape(0, 4), scores
+
+    touching = _box_intersection(boxes, boxes) > 0
+    touching &= windows[:, None] != windows[None, :]
+
+    parent = np.arange(n)
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i, j in zip(*np.nonzero(np.triu(touching))):
+        parent[find(i)] = find(j)
+
+    roots = np.array([find(i) for i in range(n)])
+    merged, merged_scores = [], []
+    for root in np.unique(roots):
+        group = roots == root
+        merged.append(
+            [
+                boxes[group, 0].min(),
+                boxes[group, 1].min(),
+                boxes[group, 2].max(),
+                boxes[group, 3].max(),
+            ]
+        )
+        merged_scores.append(scores[group].max())
+
+    merged = np.array(merged, dtype=boxes.dtype)
+    merged_scores = np.array(merged_scores, dtype=scores.dtype)
+    if len(full_boxes) == 0:
+        return merged, merged_scores
+
+    area = (merged[:, 2] - merged[:, 0]) * (merged[:, 3] - merged[:, 1])
+    covered = _box_intersection(merged, full_boxes).max(axis=1) / np.maximum(area, 1e-9)
+    keep = covered <= 0.5
+    return merged[keep], merged_scores[keep]
+
+
+def _tile_origins(length: int, tile: int, overlap: int) -> list:
+    if length <= tile:
+        return [0]
+    stride = tile - overlap
+    origins = list(range(0, length - tile, stride))
+    origins.append(length - tile)
+    return origins
+
+
+def _downscale(img: np.ndarray, factor: int) -> np.ndarray:
+    if factor <= 1:
+        return img
+    height = img.shape[0] - img.shape[0] % factor
+    width = img.shape[1] - img.shape[1] % factor
+    blocks = img[:height, :width].reshape(
+        (height // factor, factor, width // factor, factor) + img.shape[2:]
+    )
+    return blocks.mean(axis=(1, 3)).astype(img.dtype)
+
+
+def _box_intersection(boxes_a: np.ndarray, boxes_b: np.ndarray) -> np.ndarray:
+    x_min = np.maximum(boxes_a[:, None, 0], boxes_b[None, :, 0])
+    y_min = np.maximum(boxes_a[:, None, 1], boxes_b[None, :, 1])
+    x_max = np.minimum(boxes_a[:, None, 2], boxes_b[None, :, 2])
+    y_max = np.minimum(boxes_a[:, None, 3], boxes_b[None, :, 3])
+    return np.clip(x_max - x_min, 0, None) * np.clip(y_max - y_min, 0, None)
+
+
+def box_iou(boxes_a: np.ndarray, boxes_b: np.ndarray) -> np.ndarray:
+    inter = _box_intersection(boxes_a, boxes_b)
+
+    area_a = (boxes_a[:, 2] - boxes_a[:, 0]) * (boxes_a[:, 3] - boxes_a[:, 1])
+    area_b = (boxes_b[:, 2] - boxes_b[:, 0]) * (boxes_b[:, 3] - boxes_b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return inter / np.maximum(union, 1e-9)
+
+
+def nms(boxes: np.ndarray, scores: np.ndarray, iou_threshold: float) -> np.ndarray:
+    order = np.argsort(-scores)
+    iou = box_iou(boxes, boxes)
+
+    keep = []
+    suppressed = np.zeros(len(boxes), dtype=bool)
+    for i in order:
+        if suppressed[i]:
+            continue
+        keep.append(i)
+        suppressed |= iou[i] > iou_threshold
+
+    return np.array(keep, dtype=int)
+
+
 def sanitize_mask(bboxes, ctx: ctx.AppContext):
     n = len(bboxes)
     keep = np.ones(n, dtype=bool)
@@ -98,10 +310,8 @@ def object_detection(ctx: ctx.AppContext, logger):
     bboxes = get_bounding_boxes(ctx, od_img)
 
     if bboxes is None or bboxes.shape[0] == 0:
-        logger.warning(
-            "There are no valid objects detected. Skipping current position..."
-        )
-        raise ValueError("No objects detected.")
+        logger.warning("There are no valid objects detected at this position.")
+        return np.empty((0, 4), dtype=int)
 
     logger.debug(f"Detected {len(bboxes)} objects.")
 
@@ -1,6 +1,8 @@
 import os
+import shutil
 import signal
 import sys
+import time
 from functools import partial
 import logging
 
@@ -11,6 +13,8 @@ from lib.context import AppContext
 import lib.camera as cmr
 import lib.focus as fcs
 import lib.object_detection as od
+from lib.budget import AcquisitionBudget, CellPlan
+from lib.manifest import Manifest, scan_plan
 
 
 def main():
@@ -45,8 +49,35 @@ def main():
     )
     signal.signal(signal.SIGINT, handler)
 
+    try:
+        manifest = Manifest(
+            ctx.config.file.save_dir,
+            scan_plan(ctx.config),
+            ctx.config.en.resume,
+            logger,
+        )
+        if ctx.config.en.resume:
+            cmr.reset_camera(ctx, logger)
+    except Exception as e:
+        logger.fatal(f"Could not prepare the scan: {e}", exc_info=True)
+        ctx.camera.Close()
+        ctx.pidevice.CloseConnection()
+        sys.exit(1)
+
+    budget = None
+    if ctx.config.en.budget:
+        budget = AcquisitionBudget(
+            ctx.config, logger, manifest.used_bytes(), manifest.elapsed()
+        )
+    pending_tiles = (ctx.config.movement.x_step_num + 1) * (
+        ctx.config.movement.y_step_num + 1
+    ) - len(manifest.tiles)
+
     logger.info("Starting scanning process...")
+    stopped = False
     for y in range(ctx.config.movement.y_step_num + 1):
+        if stopped:
+            break
         for x in (
             range(ctx.config.movement.x_step_num + 1)
             if y % 2 == 0
@@ -55,6 +86,22 @@ def main():
             # scanning
             target_x = ctx.config.vertex.pt1[0] + x * ctx.config.movement.dx
             target_y = ctx.config.vertex.pt1[1] + y * ctx.config.movement.dy
+            tile = (x, y)
+            if tile in manifest.tiles:
+                logger.debug(f"Skipping completed position: X={target_x}, Y={target_y}")
+                continue
+
+            if budget:
+                budget.start_tile(pending_tiles)
+                reason = budget.exhausted()
+                if reason:
+                    logger.warning(
+                        f"Acquisition budget exhausted ({reason}), stopping the scan."
+                    )
+                    stopped = True
+                    break
+            pending_tiles -= 1
+
             logger.debug(f"\nMoving to position: X={target_x}, Y={target_y}")
 
             try:
@@ -70,18 +117,41 @@ def main():
                 continue
 
             # object detection
-            if ctx.config.en.object_detection:
-                logger.info("Starting object detection")
-                try:
-                    bboxes = od.object_detection(ctx, logger)
-                except Exception as e:
-                    logger.error(f"Error during object detection: {e}")
-                    continue
+            if tile in manifest.detections:
+                bboxes = manifest.detections[tile]
             else:
-                bboxes = [[0, 0, ctx.width_max, ctx.height_max]]
+                if ctx.config.en.object_detection:
+                    logger.info("Starting object detection")
+                    try:
+                        bboxes = od.object_detection(ctx, logger)
+                    except Exception as e:
+                        logger.error(f"Error during object detection: {e}")
+                        continue
+                else:
+                    bboxes = [[0, 0, ctx.width_max, ctx.height_max]]
+                manifest.record_detection(tile, (target_x, target_y), bboxes)
 
             logger.debug(f"Detected {len(bboxes)} objects.")
-            for idx, bbox in enumerate(bboxes):
+            pending = [
+                (idx, bbox)
+                for idx, bbox in enumerate(bboxes)
+                if tile + (idx,) not in manifest.cells
+            ]
+            if budget:
+                plans = budget.plan_tile(pending, ctx.width_max, ctx.height_max)
+            else:
+                plans = {
+                    idx: CellPlan(idx, ctx.config.camera.img_num, ctx.config.camera.fps)
+                    for idx, _ in pending
+                }
+
+            tile_complete = len(plans) == len(pending)
+            for idx, bbox in pending:
+                if idx not in plans:
+                    continue
+                plan = plans[idx]
+                cell_start = time.monotonic()
+
                 frame_dir = os.path.join(
                     ctx.config.file.save_dir,
                     f"position({target_x:.2f},{target_y:.2f})_cell{idx}",
@@ -95,6 +165,7 @@ def main():
                         logger.error(
                             f"Error processing object {idx}: {e}", exc_info=True
                         )
+                        tile_complete = False
                         continue
 
                 # focus
@@ -105,16 +176,34 @@ def main():
                     except Exception as e:
                         logger.error(f"Error during focusing: {e}", exc_info=True)
 
+                if plan.fps != ctx.config.camera.fps:
+                    try:
+                        ctx.camera.AcquisitionFrameRate.Value = plan.fps
+                    except Exception as e:
+                        logger.error(f"Error setting frame rate: {e}", exc_info=True)
+
                 # image capture
                 logger.info("Starting image capture...")
+                # drop frames left by an earlier, longer or interrupted burst
+                shutil.rmtree(frame_dir, ignore_errors=True)
+                capture_start = time.monotonic()
                 if ctx.config.en.depth:
                     cmr.save_range(ctx, frame_dir, logger)
                 else:
-                    cmr.save_images(
-                        ctx.camera, ctx.config.camera.img_num, frame_dir, logger
-                    )
+                    cmr.save_images(ctx.camera, plan.img_num, frame_dir, logger)
+                capture_s = time.monotonic() - capture_start
                 logger.info("Image capture complete.")
 
+                try:
+                    focus_z = ctx.pidevice.qPOS(ctx.config.axes.z)[ctx.config.axes.z]
+                except Exception as e:
+                    logger.error(f"Error reading focus position: {e}", exc_info=True)
+                    focus_z = None
+
+                record = manifest.record_cell(
+                    tile, idx, (target_x, target_y), bbox, frame_dir, focus_z
+                )
+
                 # resetting camera settings
                 try:
                     cmr.reset_camera(ctx, logger)
@@ -122,9 +211,25 @@ def main():
                     logger.fatal(f"Could not reset camera: {e}", exc_info=True)
                     ctx.camera.Close()
                     ctx.pidevice.CloseConnection()
+                    manifest.close()
                     sys.exit(1)
 
+                if budget:
+                    budget.record_cell(
+                        plan,
+                        record["bytes"],
+                        capture_s,
+                        time.monotonic() - cell_start,
+                    )
+
+            if tile_complete:
+                manifest.record_tile(tile, (target_x, target_y))
+
+    if budget:
+        budget.log_usage()
+
     logger.info("Closing connections...")
+    manifest.close()
     try:
         ctx.pidevice.CloseConnection()
     except Exception as e: